@@ -1,4 +1,10 @@
 # keywords: lambda calculus, y combinator, functional programing
+import ast
+import functools
+import keyword
+import linecache
+import platform
+from types import CodeType
 
 # in lambda calculus land, there is no variable. everything is (anonymous/lambda) function and its application
 # and our goal is to write a recursive function without self referencing the function variable name
@@ -45,12 +51,12 @@ fact = (lambda f: lambda n: 1 if n < 2 else n * f(n - 1))(fact)
 #                                                         ^^^ a hypothetical `fact` taking one true argument `n`
 # try doing copy-paste trick (copy first half to second half)
 fact = (lambda f: lambda n: 1 if n < 2 else n * f(n - 1))(lambda f: lambda n: 1 if n < 2 else n * f(n - 1))
-# we find out that `f` needs to be applied with two arguments, first with itself. just as `help` does on line 19
+# we find out that `f` needs to be applied with two arguments, first with itself. just as `help` does with `f(f, n - 1)` above
 fact = (lambda f: lambda n: 1 if n < 2 else n * f(f)(n - 1))(lambda f: lambda n: 1 if n < 2 else n * f(f)(n - 1))
 # to show everything works still
 print(fact(5))
 
-# reconsider this from line 44: 
+# reconsider the parameter-swapped `fact` from above:
 fact = (lambda f: (lambda n: 1 if n < 2 else n * f(n - 1)))(fact)
 # the first part is understandable, mostly the "business logic" of the recursive function
 # so extract out the first half, where `R_` stands for Raw - later becomes our input to `Y`
@@ -62,12 +68,12 @@ R_fact = lambda f: lambda n: 1 if n < 2 else n * f(n - 1)
 # we see R_fact(t) = (lambda x: R_fact(x))(t),
 # then Y(R_fact) = R_fact( Y(R_fact) ) = (lambda x: R_fact(x))( Y(R_fact) )
 # here think `x` as something similar to `f` above, i.e. a function
-# see `Y(R_fact)` is essentially an abstract `fact` as above on line 44
+# see `Y(R_fact)` is essentially an abstract version of the parameter-swapped `fact` above
 # and it's also under the same circumstance of self referencing variable name
 # so we need copy-paste trick (copy first half to second half) which gives:
 # Y(R_fact) = (lambda x: R_fact(x))( lambda x: R_fact(x) )
-# now same as line 46, we need to call `x` with itself.
-# this is because, see how `R_fact` uses the input parameter `f` on line 54:
+# now same as the `f(f)` step above, we need to call `x` with itself.
+# this is because, see how `R_fact` uses the input parameter `f` in its definition above:
 # `R_fact` only takes `f` that can be supplied with economic arguments, e.g. `n`
 # without partial applying `x` with itself, `x` still takes a function (itself) as first argument.
 # so we have Y(R_fact) = ( lambda x: R_fact(x(x)) )( lambda x: R_fact(x(x)) )
@@ -77,15 +83,198 @@ R_fact = lambda f: lambda n: 1 if n < 2 else n * f(n - 1)
 Y = lambda f: (lambda x: f(x(x)))(lambda x: f(x(x)))
 # make it actually work with lazy-evaluation, as python evaluates function arguments eagerly
 Y = lambda f: (lambda x: f(lambda z: x(x)(z)))(lambda x: f(lambda z: x(x)(z)))
+
+
+# PyPy only JIT-compiles a loop after ~1039 iterations, single demo calls below would all run interpreted,
+# so when measuring under PyPy, run the demo a few thousand times first (no-op on CPython)
+def warmup(thunk, n=3000):
+    if platform.python_implementation() == 'PyPy':
+        for _ in range(n):
+            thunk()
+
+
 fact = Y(R_fact)
+warmup(lambda: fact(5))
 print(fact(5))
 
 # and it can be applied generally
 R_fib = lambda f: lambda n: 1 if n < 3 else f(n - 2) + f(n - 1)
 fib = Y(R_fib)
+warmup(lambda: [fib(i) for i in range(1, 10)])
 print([fib(i) for i in range(1, 10)])
 
 # even for functions taking more than one arguments: a functional and recursive `zip`
 # note that everything is curried
 R_zip = lambda f: lambda xs: lambda ys: [] if not xs else [(xs[0], ys[0])] + f(xs[1:])(ys[1:])
+warmup(lambda: Y(R_zip)([1, 2])(['a', 'b']))
 print(Y(R_zip)([1, 2])(['a', 'b']))
+
+# but `xs[1:]` / `ys[1:]` copy the tails at every step, and `+` copies the result built so far, so `zip` above is O(n^2)
+# thread an index `i` through instead of slicing. this removes the slicing copies only, `+` still copies the result
+R_zip_idx = lambda f: lambda xs: lambda ys: lambda i: [] if i >= len(xs) else [(xs[i], ys[i])] + f(xs)(ys)(i + 1)
+print(Y(R_zip_idx)([1, 2])(['a', 'b'])(0))
+# so also thread the output list `out`, appending to it instead of concatenating, which finally makes `zip` O(n)
+# (`list.append` returns `None`, so `out.append(...) or out` appends and then evaluates to `out`)
+R_zip_acc = lambda f: lambda xs: lambda ys: lambda i: lambda out: (
+    out if i >= len(xs) else f(xs)(ys)(i + 1)(out.append((xs[i], ys[i])) or out))
+print(Y(R_zip_acc)([1, 2])(['a', 'b'])(0)([]))
+
+# back out of lambda calculus land: `Y(R_fib)` recomputes every sub-problem, so it takes exponential time
+# since `R_fib` only ever recurses through `f`, we can tie the knot with a mutable cell instead,
+# and memoize the fixed point so each `fib(n)` is computed once
+def Y_memo(f):
+    cell = [None]
+    cell[0] = functools.lru_cache(None)(f(lambda z: cell[0](z)))
+    return cell[0]
+
+
+# same `R_fib` as above, now linear time
+fib = Y_memo(R_fib)
+print(fib(100))
+
+# `Y` also hands `R_` a fresh `lambda z: x(x)(z)` at every recursion step, two extra calls per step,
+# and a JIT (e.g. PyPy) cannot specialize on a callable whose identity keeps changing.
+# `fix` gives the same fixed point, but `R_` is applied once, to a single `rec` with stable identity
+def fix(f):
+    def rec(z):
+        return body(z)
+
+    body = f(rec)
+    return body
+
+
+fact = fix(R_fact)
+warmup(lambda: fact(5))
+print(fact(5))
+fib = fix(R_fib)
+warmup(lambda: [fib(i) for i in range(1, 10)])
+print([fib(i) for i in range(1, 10)])
+warmup(lambda: fix(R_zip)([1, 2])(['a', 'b']))
+print(fix(R_zip)([1, 2])(['a', 'b']))
+
+# every recursive step still costs python frames, so e.g. `fact(5000)` hits the recursion limit.
+# for tail calls, `Y_iter` hands `R_` an `f` that doesn't recurse, but returns a `_Thunk` of the call,
+# and then runs thunks in a loop (a trampoline) until a plain value comes back
+class _Thunk:
+    __slots__ = ('fn', 'args')
+
+    def __init__(self, fn, args):
+        self.fn = fn
+        self.args = args
+
+
+def Y_iter(f):
+    def run(*args):
+        r = body(*args)
+        while type(r) is _Thunk:
+            r = r.fn(*r.args)
+        return r
+
+    body = f(lambda *args: _Thunk(body, args))
+    return run
+
+
+# `R_fact` is not tail recursive (`n * f(n - 1)` still has work left after the call), so carry an accumulator
+R_fact_tail = lambda f: lambda n, acc=1: acc if n < 2 else f(n - 1, n * acc)
+fact = Y_iter(R_fact_tail)
+print(fact(5))
+print(fact(5000).bit_length())
+
+# finally, drop the indirection altogether: read the source of `R_`, and rewrite `lambda f: lambda n: ...f(...)...`
+# into a plain `def name(n): return ...name(...)...`, i.e. the direct recursive function we started with.
+# this only handles the plain `R_ = lambda f: lambda ...: ...` form used in this file,
+# and raises `ValueError` on anything it cannot rewrite faithfully (closures, name clashes, `f` rebound inside)
+_specialized = {}
+
+
+class _Rename(ast.NodeTransformer):
+    def __init__(self, old, new):
+        self.old = old
+        self.new = new
+
+    def visit_Name(self, node):
+        return ast.copy_location(ast.Name(self.new, node.ctx), node) if node.id == self.old else node
+
+
+def _same_const(x, y):
+    if isinstance(x, CodeType) and isinstance(y, CodeType):
+        return _same_code(x, y)
+    if isinstance(x, str) and isinstance(y, str) and x.endswith('<lambda>') and y.endswith('<lambda>'):
+        # qualnames of nested lambdas depend on where the code was compiled, not on what it does
+        return True
+    return type(x) is type(y) and x == y
+
+
+def _same_code(a, b):
+    # nested code objects (e.g. the inner lambda) live in `co_consts`, so compare those recursively too
+    if a.co_code != b.co_code or a.co_names != b.co_names or len(a.co_consts) != len(b.co_consts):
+        return False
+    return all(_same_const(x, y) for x, y in zip(a.co_consts, b.co_consts))
+
+
+def _matches(node, code):
+    # several lambdas can share a line, so check that `node` is really the one `code` was compiled from
+    if hasattr(code, 'co_positions'):
+        # python 3.11+ records source positions, the body's span pins down the lambda exactly
+        span = (node.body.lineno, node.body.end_lineno, node.body.col_offset, node.body.end_col_offset)
+        return span in set(code.co_positions())
+    # older pythons (and PyPy): compile the candidate on its own and compare bytecode
+    compiled = compile(ast.Expression(node), code.co_filename, 'eval')
+    return any(isinstance(c, CodeType) and _same_code(c, code) for c in compiled.co_consts)
+
+
+def _find_lambda(R):
+    code = R.__code__
+    source = ''.join(linecache.getlines(code.co_filename))
+    if not source:
+        raise ValueError(f"cannot find the lambda source of {R!r}")
+    for node in ast.walk(ast.parse(source)):
+        if not isinstance(node, ast.Lambda) or node.lineno != code.co_firstlineno:
+            continue
+        if tuple(arg.arg for arg in node.args.args) == code.co_varnames and _matches(node, code):
+            return node
+    raise ValueError(f"cannot find the lambda source of {R!r}")
+
+
+def specialize(R, name):
+    if not name.isidentifier() or keyword.iskeyword(name):
+        raise ValueError(f"`{name}` is not a valid function name")
+    if (R, name) not in _specialized:
+        if R.__closure__:
+            raise ValueError(f"{R!r} closes over {R.__code__.co_freevars}, which a generated `def` cannot see")
+        outer = _find_lambda(R)
+        if len(outer.args.args) != 1 or not isinstance(outer.body, ast.Lambda):
+            raise ValueError(f"{R!r} is not of the form `lambda f: lambda ...: ...`")
+        f, inner = outer.args.args[0].arg, outer.body
+        params = {node.arg for node in ast.walk(inner) if isinstance(node, ast.arg)}
+        names = {node.id for node in ast.walk(inner) if isinstance(node, ast.Name)}
+        if name != f and name in params | names:
+            raise ValueError(f"`{name}` is already used in {R!r}")
+        # `f` as a parameter of `inner` or of a nested lambda
+        f_is_param = f in params
+        # `f` assigned inside the body, e.g. a comprehension target or `:=`
+        f_is_assigned = any(isinstance(node, ast.Name) and node.id == f and not isinstance(node.ctx, ast.Load)
+                            for node in ast.walk(inner.body))
+        # `f` in a default value of `inner`, which the `def` would evaluate before `name` exists
+        f_in_defaults = any(isinstance(node, ast.Name) and node.id == f for node in ast.walk(inner.args))
+        if f_is_param or f_is_assigned:
+            raise ValueError(f"`{f}` is rebound inside {R!r}")
+        if f_in_defaults:
+            raise ValueError(f"`{f}` is used in a parameter default of {R!r}")
+        body = _Rename(f, name).visit(inner.body)
+        # wrap the `def` in a factory, so `name` is a closure variable, while every other name stays a live
+        # lookup in `R`'s globals, same as for `Y(R)`. `scope` only catches the factory, keeping the globals clean
+        src = (f"def _make():\n"
+               f"    def {name}({ast.unparse(inner.args)}):\n"
+               f"        return {ast.unparse(body)}\n"
+               f"    return {name}\n")
+        scope = {}
+        exec(compile(src, f"<specialize {name}>", "exec"), R.__globals__, scope)
+        _specialized[R, name] = scope['_make']()
+    return _specialized[R, name]
+
+
+fact = specialize(R_fact, 'fact')
+print(fact(5))
+fib = specialize(R_fib, 'fib')
+print([fib(i) for i in range(1, 10)])